@@ -1,5 +1,6 @@
 import streamlit as st
 from data_anonymizer import DataAnonymizer
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
 
@@ -27,6 +28,113 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_anonymizer():
+    # Build the anonymizer once per process and share it across reruns
+    return DataAnonymizer()
+
+def query_entities(text: str, anonymizer: DataAnonymizer):
+    # Split the input into paragraphs and send them to the model as one batch
+    chunks = []
+    chunk_offsets = []
+    position = 0
+    for chunk in text.split('\n\n'):
+        if chunk.strip():
+            chunks.append(chunk)
+            chunk_offsets.append(position)
+        position += len(chunk) + 2
+    
+    # Shift the model entities back to offsets in the full text
+    ner_results = []
+    # Decide on preprocessing once for the whole text so every paragraph is treated alike
+    preprocess = anonymizer._needs_preprocess(text)
+    for chunk_offset, chunk_results in zip(chunk_offsets, anonymizer._query_model_batch(chunks, preprocess)):
+        for entity in chunk_results:
+            if isinstance(entity, dict):
+                entity = dict(entity)
+                entity['start'] = entity.get('start', 0) + chunk_offset
+                entity['end'] = entity.get('end', 0) + chunk_offset
+            ner_results.append(entity)
+    return ner_results
+
+def anonymize_entities(text: str, anonymizer: DataAnonymizer, query_ner):
+    # Anonymize text using the NER results returned by query_ner
+    
+    # Query the BERT model and run the email/phone regexes concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ner_future = executor.submit(query_ner)
+        additional_future = executor.submit(lambda: anonymizer._detect_email(text) + anonymizer._detect_phone(text))
+        ner_results = ner_future.result()
+        additional_entities = additional_future.result()
+    
+    # Add replacement information to additional entities
+    for entity in additional_entities:
+        entity['replacement'] = anonymizer.replacement_dict.get(entity['entity'], '[UNKNOWN]')
+    
+    # Combine and sort all entities
+    all_entities = []
+    for entity in ner_results:
+        if isinstance(entity, dict):
+            entity_group = entity.get('entity_group', entity.get('label', ''))
+            entity_group = entity_group.split('-')[-1] if '-' in entity_group else entity_group
+    
+            start = entity.get('start', 0)
+            end = entity.get('end', 0)
+            word = entity.get('word', '')
+    
+            # Handle case sensitivity for person names
+            if entity_group == 'PER':
+                is_upper, is_lower, is_title, _ = anonymizer._classify_case(word)
+                # Check if the word is all uppercase
+                if is_upper:
+                    replacement = '[PERSON]'
+                # Check if the word is all lowercase
+                elif is_lower:
+                    replacement = '[person]'
+                # Check if the word is title case
+                elif is_title:
+                    replacement = '[Person]'
+                # Default to original case
+                else:
+                    replacement = '[PERSON]'
+            else:
+                replacement = anonymizer.replacement_dict.get(entity_group, '[UNKNOWN]')
+    
+            all_entities.append({
+                'entity': entity_group,
+                'start': start,
+                'end': end,
+                'word': word,
+                'replacement': replacement
+            })
+    
+    all_entities.extend(additional_entities)
+    
+    # Also replace repeat mentions the model did not return
+    all_entities.extend(anonymizer._find_repeat_mentions(text, all_entities))
+    
+    # Drop overlapping spans so each part of the text is replaced once
+    all_entities = anonymizer._resolve_overlaps(all_entities)
+    
+    # Create anonymized text
+    anonymized_text = anonymizer._replace_entities(text, all_entities)
+
+    return anonymized_text, all_entities, ner_results
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def run_pipeline(text: str, _anonymizer: DataAnonymizer):
+    # Anonymize text with a full query, memoized on the input so identical submissions skip
+    # the model call. The anonymizer is underscore-prefixed so Streamlit does not hash it.
+    return anonymize_entities(text, _anonymizer, lambda: query_entities(text, _anonymizer))
+
+def run_incremental(text: str, anonymizer: DataAnonymizer, previous):
+    # When the text is a small edit of this session's previous submission, only re-query the
+    # edited window. Not cached, since the result depends on the previous (text, NER results) pair.
+    ner_results = anonymizer._query_model_incremental(text, *previous)
+    if ner_results is None:
+        return None
+    return anonymize_entities(text, anonymizer, lambda: ner_results)
+
 def main():
     # Title and description
     st.title("Text Anonymizer")
@@ -41,7 +149,7 @@ def main():
 
     # Initialize the anonymizer
     try:
-        anonymizer = DataAnonymizer()
+        anonymizer = get_anonymizer()
     except ValueError as e:
         st.error(f"Error: {str(e)}")
         st.info("Please make sure you have set the HF_TOKENS environment variable in your .env file")
@@ -50,6 +158,11 @@ def main():
     # Create two columns for input and output
     col1, col2 = st.columns(2)
 
+    # Reserve the results area up front; it is only filled once there are results to show
+    with col2:
+        st.subheader("Results")
+        output_placeholder = st.empty()
+
     with col1:
         st.subheader("Input Text")
         # Text input area
@@ -63,64 +176,16 @@ def main():
         if st.button("Anonymize Text", type="primary"):
             if input_text.strip():
                 try:
-                    # Get the entities from BERT model
-                    ner_results = anonymizer._query_model(input_text)
-                    
-                    # Get additional entities (email and phone)
-                    additional_entities = anonymizer._detect_email(input_text) + anonymizer._detect_phone(input_text)
-                    
-                    # Add replacement information to additional entities
-                    for entity in additional_entities:
-                        entity['replacement'] = anonymizer.replacement_dict.get(entity['entity'], '[UNKNOWN]')
-                    
-                    # Combine and sort all entities
-                    all_entities = []
-                    for entity in ner_results:
-                        if isinstance(entity, dict):
-                            entity_group = entity.get('entity_group', entity.get('label', ''))
-                            entity_group = entity_group.split('-')[-1] if '-' in entity_group else entity_group
-                            
-                            start = entity.get('start', 0)
-                            end = entity.get('end', 0)
-                            word = entity.get('word', '')
-                            
-                            # Handle case sensitivity for person names
-                            if entity_group == 'PER':
-                                # Check if the word is all uppercase
-                                if word.isupper():
-                                    replacement = '[PERSON]'
-                                # Check if the word is all lowercase
-                                elif word.islower():
-                                    replacement = '[person]'
-                                # Check if the word is title case
-                                elif word.istitle():
-                                    replacement = '[Person]'
-                                # Default to original case
-                                else:
-                                    replacement = '[PERSON]'
-                            else:
-                                replacement = anonymizer.replacement_dict.get(entity_group, '[UNKNOWN]')
-                            
-                            all_entities.append({
-                                'entity': entity_group,
-                                'start': start,
-                                'end': end,
-                                'word': word,
-                                'replacement': replacement
-                            })
-                    
-                    all_entities.extend(additional_entities)
-                    all_entities.sort(key=lambda x: x['start'], reverse=True)
-
-                    # Create anonymized text
-                    anonymized_text = input_text
-                    for entity in all_entities:
-                        replacement = entity.get('replacement', anonymizer.replacement_dict.get(entity['entity'], '[UNKNOWN]'))
-                        anonymized_text = anonymized_text[:entity['start']] + replacement + anonymized_text[entity['end']:]
+                    previous = st.session_state.get('last_ner')
+                    results = run_incremental(input_text, anonymizer, previous) if previous is not None else None
+                    if results is None:
+                        results = run_pipeline(input_text, anonymizer)
+                    anonymized_text, all_entities, ner_results = results
 
                     # Store results in session state
                     st.session_state.anonymized_text = anonymized_text
                     st.session_state.detected_entities = all_entities
+                    st.session_state.last_ner = (input_text, ner_results)
 
                 except Exception as e:
                     st.error(f"An error occurred: {str(e)}")
@@ -128,23 +193,23 @@ def main():
                 st.warning("Please enter some text to anonymize.")
 
     with col2:
-        st.subheader("Results")
-        
         # Display anonymized text
         if 'anonymized_text' in st.session_state:
-            st.markdown("**Anonymized Text:**")
-            st.text_area("", st.session_state.anonymized_text, height=300)
+            with output_placeholder.container():
+                st.markdown("**Anonymized Text:**")
+                st.text_area("", st.session_state.anonymized_text, height=300)
             
             # Display detected entities with case information
             st.markdown("**Detected Entities:**")
             for entity in sorted(st.session_state.detected_entities, key=lambda x: x['start']):
                 case_info = ""
                 if entity['entity'] == 'PER':
-                    if entity['word'].isupper():
+                    is_upper, is_lower, is_title, _ = anonymizer._classify_case(entity['word'])
+                    if is_upper:
                         case_info = " (UPPERCASE)"
-                    elif entity['word'].islower():
+                    elif is_lower:
                         case_info = " (lowercase)"
-                    elif entity['word'].istitle():
+                    elif is_title:
                         case_info = " (Title Case)"
                 st.markdown(f"- **Text:** '{entity['word']}' → **Label:** {entity['entity']}{case_info} → **Replacement:** {entity.get('replacement', '[UNKNOWN]')}")
 
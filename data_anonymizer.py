@@ -1,15 +1,143 @@
 import os
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import unicodedata
 import json
+import bisect
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import sqlite3
+import threading
+
+# Email and phone scans run over arbitrary user input, so use RE2's linear-time engine when it is installed
+try:
+    import re2
+    _compile_scan = re2.compile
+except ImportError:
+    # RE2's \b, \w, \d and \s are ASCII-only; match that so results do not depend on the engine
+    _compile_scan = functools.partial(re.compile, flags=re.ASCII)
+
+# Repeat mentions of detected entities are located with an Aho-Corasick automaton when it is installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Load environment variables
 load_dotenv()
 
+# Cache of NER responses, keyed by a hash of the model name and input text. Responses contain
+# the detected entity text, so the cache is kept in memory unless NER_CACHE_PATH opts in to a file
+_CACHE_PATH = os.getenv('NER_CACHE_PATH', ':memory:')
+_CACHE_MAX_ENTRIES = int(os.getenv('NER_CACHE_MAX_ENTRIES', '1024'))
+_cache_lock = threading.Lock()
+_cache_conn = None
+
+def _get_cache_conn() -> sqlite3.Connection:
+    """
+    Open the cache database on first use. Must be called with _cache_lock held.
+    Returns:
+        sqlite3.Connection: Connection to the cache database
+    """
+    global _cache_conn
+    if _cache_conn is None:
+        _cache_conn = sqlite3.connect(_CACHE_PATH, check_same_thread=False)
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS ner_cache (key TEXT PRIMARY KEY, json BLOB)")
+        _cache_conn.commit()
+    return _cache_conn
+
+# Regex patterns compiled once at import
+_EMAIL_RE = _compile_scan(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+
+# International phone numbers: optional country code, optional area code in parentheses,
+# then up to four digit groups separated by '-', '.' or a space. RE2 has no lookbehind,
+# so the number is captured in group 1 after a start-of-text or non-word, non-'+' character
+_PHONE_RE = _compile_scan(r'(?:^|[^A-Za-z0-9_+])((?:\+?[0-9]{1,3}[-. ]?)?\(?[0-9]{1,4}\)?(?:[-. ]?[0-9]{1,4}){1,4})\b')
+
+# Numbers split only by spaces (years, table columns) need one of these to count as a phone number
+_PHONE_MARKERS = frozenset('+(-.')
+
+# Runs of alphanumeric characters, used to widen entities to whole words
+_WORD_RE = re.compile(r'[^\W_]+')
+
+# Whitespace-delimited words of three or more letters, the only ones whose case is adjusted
+_CASE_FIX_RE = re.compile(r'(?<!\S)[^\W\d_]{3,}(?!\S)')
+
+def _fix_upper_word_case(match) -> str:
+    """
+    Title-case an all-uppercase word
+    Args:
+        match: Regex match for a single word
+    Returns:
+        str: Word with adjusted case
+    """
+    word = match.group()
+    if not word.isupper():
+        return word
+    fixed = word.title()
+    # Keep the text length unchanged so model offsets still line up with the input
+    return fixed if len(fixed) == len(word) else word
+
+def _fix_word_case(match) -> str:
+    """
+    Title-case an all-uppercase or all-lowercase word
+    Args:
+        match: Regex match for a single word
+    Returns:
+        str: Word with adjusted case
+    """
+    word = match.group()
+    # If it's a single word in uppercase, it might be an organization
+    if word.isupper():
+        return _fix_upper_word_case(match)
+    # Lowercase words might be person names
+    if word.islower():
+        fixed = word.capitalize()
+        # Keep the text length unchanged so model offsets still line up with the input
+        return fixed if len(fixed) == len(word) else word
+    return word
+
+# Number of leading characters sampled when deciding whether text needs case preprocessing
+_PREPROCESS_SAMPLE_SIZE = 4096
+
+# First letter of the text, which well-cased text capitalizes
+_FIRST_LETTER_RE = re.compile(r'[^\W\d_]')
+
+# Characters of unchanged context sent on each side of an edit when re-querying the model
+_INCREMENTAL_CONTEXT = 128
+
+# Valid phone numbers have between 6 and 15 digits (E.164 maximum)
+_PHONE_MIN_DIGITS = 6
+_PHONE_MAX_DIGITS = 15
+
+# Common location suffixes and prefixes for better detection
+_LOCATION_SUFFIXES = ('burg', 'berg', 'town', 'city', 'ville', 'polis', 'grad', 'abad', 'pur', 'nagar', 'pore', 'stan', 'land', 'ia', 'ya')
+_LOCATION_PREFIXES = ('new', 'old', 'north', 'south', 'east', 'west', 'upper', 'lower', 'port', 'fort', 'saint', 'san', 'santa')
+_LOC_SUFFIX_RE = re.compile(r'(?:' + '|'.join(map(re.escape, _LOCATION_SUFFIXES)) + r')$', re.IGNORECASE)
+_LOC_PREFIX_RE = re.compile(r'(?:' + '|'.join(map(re.escape, _LOCATION_PREFIXES)) + r')', re.IGNORECASE)
+
 class DataAnonymizer:
+    # Common surname patterns from different cultures
+    SURNAME_PATTERNS = {
+        'slavic': ('ov', 'ev', 'ski', 'sky', 'ova', 'eva'),
+        'asian': ('yan', 'ian', 'jin', 'chen', 'li', 'wang'),
+        'nordic': ('sen', 'sson', 'dottir', 'dóttir'),
+        'middle_eastern': ('zadeh', 'oglu', 'pour'),
+        'indian': ('raj', 'kumar', 'singh', 'patel', 'sharma'),
+        'hispanic': ('ez', 'es', 'os', 'as', 'is')
+    }
+    
+    # Matches a word ending in any of the surname patterns
+    _SURNAME_RE = re.compile(
+        r'(?:' + '|'.join(re.escape(pattern) for patterns in SURNAME_PATTERNS.values() for pattern in patterns) + r')$',
+        re.IGNORECASE
+    )
+
     def __init__(self, model_name: str = "dbmdz/bert-large-cased-finetuned-conll03-english"):
         """
         Initialize the DataAnonymizer with BERT model API.
@@ -22,7 +150,14 @@ class DataAnonymizer:
             
         self.model_name = model_name
         self.api_url = f"https://api-inference.huggingface.co/models/{model_name}"
-        self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.headers = {"Authorization": f"Bearer {self.api_key}", "X-Use-Cache": "true"}
+        
+        # Pooled session so repeated calls reuse one keep-alive TCP/TLS connection
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retries = Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504], allowed_methods=["POST"])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries)
+        self.session.mount("https://", adapter)
         
         # Dictionary to map entity labels to replacement text
         self.replacement_dict = {
@@ -34,6 +169,18 @@ class DataAnonymizer:
             'PHONE': '[PHONE]'
         }
 
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _classify_case(word: str) -> Tuple[bool, bool, bool, bool]:
+        """
+        Classify the case of a word, memoized so repeated mentions are only checked once
+        Args:
+            word (str): Word to classify
+        Returns:
+            Tuple[bool, bool, bool, bool]: isupper, islower, istitle and isalpha of the word
+        """
+        return word.isupper(), word.islower(), word.istitle(), word.isalpha()
+
     def _normalize_text(self, text: str) -> str:
         """
         Normalize text by converting to NFKC form while preserving case.
@@ -45,44 +192,148 @@ class DataAnonymizer:
         text = unicodedata.normalize('NFKC', text)
         return text
 
-    def _preprocess_text(self, text: str) -> str:
+    def _normalize_text_with_offsets(self, text: str) -> Tuple[str, Optional[List[int]]]:
+        """
+        Normalize text to NFKC form and map each normalized character back to the input.
+        Args:
+            text (str): Input text to normalize
+        Returns:
+            Tuple[str, Optional[List[int]]]: Normalized text and a map where entry i is the index
+            in the input of normalized character i (with a final entry for the end of the text),
+            or None when the text is already normalized
+        """
+        normalized = self._normalize_text(text)
+        if normalized == text:
+            return text, None
+        
+        # Only the words that change under normalization need a character-level map
+        pieces = []
+        offset_map = []
+        self._normalize_span_with_offsets(text, 0, len(text), pieces, offset_map)
+        offset_map.append(len(text))
+        
+        # Piecewise normalization must reproduce NFKC exactly; otherwise skip normalization
+        if ''.join(pieces) != normalized:
+            return text, None
+        return normalized, offset_map
+
+    def _normalize_span_with_offsets(self, text: str, start: int, end: int,
+                                     pieces: List[str], offset_map: List[int]) -> None:
+        """
+        Normalize text[start:end], halving it until the parts that change are single words.
+        Spaces and newlines never compose with neighbouring characters, so the text can be
+        split after them and each part normalized independently.
+        Args:
+            text (str): Input text
+            start (int): Start of the span
+            end (int): End of the span
+            pieces (List[str]): Normalized pieces, appended to
+            offset_map (List[int]): Input index of each normalized character, appended to
+        """
+        span = text[start:end]
+        if unicodedata.is_normalized('NFKC', span):
+            pieces.append(span)
+            offset_map.extend(range(start, end))
+            return
+        
+        mid = (start + end) // 2
+        split = max(text.rfind(' ', start, mid), text.rfind('\n', start, mid)) + 1
+        if split <= start:
+            after = [i for i in (text.find(' ', mid, end - 1), text.find('\n', mid, end - 1)) if i != -1]
+            split = min(after) + 1 if after else end
+        if split >= end:
+            piece, offsets = self._normalize_segment_with_offsets(span, start)
+            pieces.append(piece)
+            offset_map.extend(offsets)
+            return
+        self._normalize_span_with_offsets(text, start, split, pieces, offset_map)
+        self._normalize_span_with_offsets(text, split, end, pieces, offset_map)
+
+    def _normalize_segment_with_offsets(self, segment: str, base: int) -> Tuple[str, List[int]]:
+        """
+        Normalize a word to NFKC form and map each normalized character back to the input.
+        Args:
+            segment (str): Word to normalize
+            base (int): Index of the word in the input text
+        Returns:
+            Tuple[str, List[int]]: Normalized word and the input index of each of its characters
+        """
+        if unicodedata.is_normalized('NFKC', segment):
+            return segment, list(range(base, base + len(segment)))
+        
+        # Split into clusters of a base character and its combining marks
+        bounds = [i for i in range(len(segment)) if i == 0 or not unicodedata.combining(segment[i])]
+        bounds.append(len(segment))
+        clusters = [segment[start:end] for start, end in zip(bounds, bounds[1:])]
+        failing = [not unicodedata.is_normalized('NFKC', cluster) for cluster in clusters]
+        
+        # Normalize runs of changing clusters together with the clusters on either side,
+        # which they may compose with
+        in_run = [
+            failing[i] or (i > 0 and failing[i-1]) or (i + 1 < len(clusters) and failing[i+1])
+            for i in range(len(clusters))
+        ]
+        pieces = []
+        offsets = []
+        i = 0
+        while i < len(clusters):
+            if not in_run[i]:
+                pieces.append(clusters[i])
+                offsets.extend(range(base + bounds[i], base + bounds[i+1]))
+                i += 1
+                continue
+            j = i
+            while j < len(clusters) and in_run[j]:
+                j += 1
+            run = self._normalize_text(segment[bounds[i]:bounds[j]])
+            cluster_pieces = [self._normalize_text(cluster) for cluster in clusters[i:j]]
+            if ''.join(cluster_pieces) == run:
+                # Each cluster normalizes on its own, so map characters to their cluster
+                for k, piece in zip(range(i, j), cluster_pieces):
+                    offsets.extend([base + bounds[k]] * len(piece))
+            else:
+                # Clusters compose with each other, so map the whole run to its start
+                offsets.extend([base + bounds[i]] * len(run))
+            pieces.append(run)
+            i = j
+        
+        normalized = self._normalize_text(segment)
+        if ''.join(pieces) != normalized:
+            return normalized, [base] * len(normalized)
+        return normalized, offsets
+
+    def _preprocess_text(self, text: str, full: bool = True) -> str:
         """
         Preprocess text for better entity detection while preserving original case.
+        The result has the same length as the input, so entity offsets apply to both.
         Args:
             text (str): Input text to preprocess
+            full (bool): Title-case all-lowercase words as well as all-uppercase ones.
+                When False, only all-uppercase words are title-cased.
         Returns:
             str: Preprocessed text
         """
-        # Split text into lines
-        lines = text.split('\n')
-        processed_lines = []
-        
-        for line in lines:
-            # Split line into words
-            words = line.split()
-            processed_words = []
-            
-            for word in words:
-                # Handle organizations and locations
-                if word.isupper() and len(word) > 2:
-                    # If it's a single word in uppercase, it might be an organization
-                    if word.isalpha():
-                        processed_words.append(word.title())
-                    # If it contains numbers or special chars, it's likely an organization
-                    else:
-                        processed_words.append(word)
-                # Handle person names
-                elif word.islower() and len(word) > 2:
-                    if word.isalpha() and word[0].isalpha():
-                        processed_words.append(word.capitalize())
-                    else:
-                        processed_words.append(word)
-                else:
-                    processed_words.append(word)
-            
-            processed_lines.append(' '.join(processed_words))
-        
-        return '\n'.join(processed_lines)
+        # Words containing numbers or special chars are left untouched
+        return _CASE_FIX_RE.sub(_fix_word_case if full else _fix_upper_word_case, text)
+
+    def _needs_preprocess(self, text: str) -> bool:
+        """
+        Check whether text is cased badly enough to need full preprocessing. The model is cased,
+        so well-cased text only has its all-uppercase words title-cased.
+        Args:
+            text (str): Input text
+        Returns:
+            bool: True if the text is mostly uppercase, has no uppercase letters, or starts with
+            a lowercase letter
+        """
+        sample = text[:_PREPROCESS_SAMPLE_SIZE]
+        upper = sum(map(str.isupper, sample))
+        lower = sum(map(str.islower, sample))
+        if upper > lower or upper == 0:
+            return True
+        # Well-cased text starts with a capital letter
+        first_letter = _FIRST_LETTER_RE.search(sample)
+        return first_letter is not None and first_letter.group().islower()
 
     def _detect_email(self, text: str) -> List[Dict]:
         """
@@ -92,9 +343,8 @@ class DataAnonymizer:
         Returns:
             List[Dict]: List of detected email addresses with positions
         """
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
         matches = []
-        for match in re.finditer(email_pattern, text):
+        for match in _EMAIL_RE.finditer(text):
             matches.append({
                 'entity': 'EMAIL',
                 'start': match.start(),
@@ -111,59 +361,265 @@ class DataAnonymizer:
         Returns:
             List[Dict]: List of detected phone numbers with positions
         """
-        # International phone number patterns
-        phone_patterns = [
-            r'\b(?:\+?\d{1,3}[-.]?)?\(?\d{3}\)?[-.]?\d{3}[-.]?\d{4}\b',  # Standard US/Canada
-            r'\b(?:\+?\d{1,3}[-.]?)?\d{2,4}[-.]?\d{2,4}[-.]?\d{2,4}\b',  # International
-            r'\b(?:\+?\d{1,3}[-.]?)?\d{1,4}[-.]?\d{1,4}[-.]?\d{1,4}\b',  # Flexible format
-            r'\b(?:\+?\d{1,3}[-.]?)?\d{1,3}[-.]?\d{1,3}[-.]?\d{1,3}\b',  # Short format
-            r'\b(?:\+?\d{1,3}[-.]?)?\d{1,2}[-.]?\d{1,2}[-.]?\d{1,2}\b'   # Very short format
-        ]
-        
         matches = []
-        for pattern in phone_patterns:
-            for match in re.finditer(pattern, text):
-                # Validate the phone number
-                phone = match.group().replace('-', '').replace('.', '').replace('(', '').replace(')', '')
-                if len(phone) >= 6:  # Minimum length for a valid phone number
-                    matches.append({
-                        'entity': 'PHONE',
-                        'start': match.start(),
-                        'end': match.end(),
-                        'word': match.group(),
-                        'replacement': '[PHONE]'
-                    })
+        for match in _PHONE_RE.finditer(text):
+            # Validate the phone number by its digit count
+            phone = match.group(1)
+            if ' ' in phone and _PHONE_MARKERS.isdisjoint(phone):
+                continue
+            digits = sum(ch.isdigit() for ch in phone)
+            if _PHONE_MIN_DIGITS <= digits <= _PHONE_MAX_DIGITS:
+                matches.append({
+                    'entity': 'PHONE',
+                    'start': match.start(1),
+                    'end': match.end(1),
+                    'word': phone,
+                    'replacement': '[PHONE]'
+                })
         return matches
 
-    def _query_model(self, text: str) -> List[Dict]:
+    def _cache_key(self, text: str) -> str:
         """
-        Query the BERT model API for NER
+        Build the cache key for a model input
+        Args:
+            text (str): Preprocessed text sent to the model
+        Returns:
+            str: SHA-256 hex digest of the model name and text
+        """
+        return hashlib.sha256((self.model_name + "\x00" + text).encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key: str):
+        """
+        Look up a cached API response
+        Args:
+            key (str): Cache key
+        Returns:
+            The decoded response, or None if not cached
+        """
+        with _cache_lock:
+            row = _get_cache_conn().execute("SELECT json FROM ner_cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _cache_put(self, key: str, result) -> None:
+        """
+        Store an API response in the cache
+        Args:
+            key (str): Cache key
+            result: Decoded API response
+        """
+        with _cache_lock:
+            conn = _get_cache_conn()
+            conn.execute("INSERT OR REPLACE INTO ner_cache (key, json) VALUES (?, ?)", (key, json.dumps(result)))
+            # Evict the oldest entries beyond the size limit
+            conn.execute(
+                "DELETE FROM ner_cache WHERE rowid NOT IN (SELECT rowid FROM ner_cache ORDER BY rowid DESC LIMIT ?)",
+                (_CACHE_MAX_ENTRIES,)
+            )
+            conn.commit()
+
+    def _query_model_incremental(self, text: str, previous_text: str, previous_results: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Query the BERT model API only for the part of text that changed since a previous query.
+        Entities in the unchanged prefix and suffix are reused from the previous results.
         Args:
             text (str): Input text
+            previous_text (str): Text of the previous query
+            previous_results (List[Dict]): NER results of the previous query
         Returns:
-            List[Dict]: NER results from model
+            Optional[List[Dict]]: NER results for text, or None if the edit is too large for a partial query
+        """
+        if text == previous_text:
+            return previous_results
+        
+        # Find the unchanged prefix and suffix
+        prefix = len(os.path.commonprefix([text, previous_text]))
+        suffix = len(os.path.commonprefix([text[prefix:][::-1], previous_text[prefix:][::-1]]))
+        
+        # Window around the edit with some context, widened to whitespace so no word is cut
+        window_start = max(0, prefix - _INCREMENTAL_CONTEXT)
+        window_end = min(len(text), len(text) - suffix + _INCREMENTAL_CONTEXT)
+        while window_start > 0 and not text[window_start-1].isspace():
+            window_start -= 1
+        while window_end < len(text) and not text[window_end].isspace():
+            window_end += 1
+        
+        # Not worth it unless the window is much shorter than the whole text
+        if (window_end - window_start) * 2 > len(text):
+            return None
+        
+        shift = len(text) - len(previous_text)
+        results = [entity for entity in previous_results if isinstance(entity, dict) and entity.get('end', 0) <= window_start]
+        # Decide on preprocessing from the whole document, not the window, so an edited
+        # resubmission is preprocessed the same way as a fresh one
+        preprocess = self._needs_preprocess(text)
+        for entity in self._query_model(text[window_start:window_end], preprocess):
+            if isinstance(entity, dict):
+                entity = dict(entity)
+                entity['start'] = entity.get('start', 0) + window_start
+                entity['end'] = entity.get('end', 0) + window_start
+            results.append(entity)
+        for entity in previous_results:
+            if isinstance(entity, dict) and entity.get('start', 0) >= window_end - shift:
+                entity = dict(entity)
+                entity['start'] += shift
+                entity['end'] += shift
+                results.append(entity)
+        return results
+
+    def _parse_batch_response(self, result, count: int) -> List[List[Dict]]:
+        """
+        Split an API response into one entity list per input
+        Args:
+            result: Decoded API response
+            count (int): Number of inputs sent in the request
+        Returns:
+            List[List[Dict]]: NER results for each input
+        """
+        # Handle different possible response structures
+        if isinstance(result, list):
+            if len(result) > 0 and isinstance(result[0], list):
+                batch = result  # Handle nested list structure
+            elif count == 1:
+                batch = [result]  # Handle flat list structure
+            else:
+                raise ValueError("Unexpected API response structure: flat list for batched inputs")
+        elif isinstance(result, dict) and count == 1:
+            batch = [result.get('entities', [])]  # Handle dictionary structure
+        else:
+            raise ValueError(f"Unexpected API response structure: {type(result)}")
+        
+        if len(batch) != count:
+            raise ValueError(f"Expected {count} results from model API, got {len(batch)}")
+        return batch
+
+    def _query_model_batch(self, texts: List[str], preprocess: Optional[bool] = None) -> List[List[Dict]]:
+        """
+        Query the BERT model API for NER on several texts in one request
+        Args:
+            texts (List[str]): Input texts
+            preprocess (Optional[bool]): Whether to fully preprocess the texts, as decided by
+                _needs_preprocess on the document they come from. None decides for each text.
+        Returns:
+            List[List[Dict]]: NER results from model, one list per input text
         """
         try:
             # Preprocess text for better detection
-            processed_text = self._preprocess_text(text)
+            processed_texts = [
+                self._preprocess_text(text, full=self._needs_preprocess(text) if preprocess is None else preprocess)
+                for text in texts
+            ]
             
-            response = requests.post(self.api_url, headers=self.headers, json={"inputs": processed_text})
-            response.raise_for_status()
-            result = response.json()
+            # Serve repeated inputs from the local cache
+            cache_keys = [self._cache_key(text) for text in processed_texts]
+            results = [self._cache_get(key) for key in cache_keys]
             
-            # Handle different possible response structures
-            if isinstance(result, list):
-                if len(result) > 0 and isinstance(result[0], list):
-                    return result[0]  # Handle nested list structure
-                return result  # Handle flat list structure
-            elif isinstance(result, dict):
-                return result.get('entities', [])  # Handle dictionary structure
-            else:
-                raise ValueError(f"Unexpected API response structure: {type(result)}")
+            # Send all cache misses to the API in a single request
+            missing = [i for i, result in enumerate(results) if result is None]
+            if missing:
+                inputs = [processed_texts[i] for i in missing]
+                response = self.session.post(self.api_url, json={"inputs": inputs, "options": {"use_cache": True}}, timeout=(3.05, 30))
+                response.raise_for_status()
+                batch = self._parse_batch_response(response.json(), len(inputs))
+                for i, entities in zip(missing, batch):
+                    results[i] = entities
+                    self._cache_put(cache_keys[i], entities)
+            
+            return results
                 
         except requests.exceptions.RequestException as e:
             raise Exception(f"Error querying model API: {str(e)}")
 
+    def _query_model(self, text: str, preprocess: Optional[bool] = None) -> List[Dict]:
+        """
+        Query the BERT model API for NER
+        Args:
+            text (str): Input text
+            preprocess (Optional[bool]): Whether to fully preprocess the text; None decides from the text
+        Returns:
+            List[Dict]: NER results from model
+        """
+        return self._query_model_batch([text], preprocess)[0]
+
+    def _resolve_overlaps(self, entities: List[Dict]) -> List[Dict]:
+        """
+        Drop entities that overlap an earlier one, preferring the longer span at the same start
+        Args:
+            entities (List[Dict]): Entities with start and end positions
+        Returns:
+            List[Dict]: Non-overlapping entities sorted by start position
+        """
+        kept = []
+        last_end = -1
+        for entity in sorted(entities, key=lambda x: (x['start'], -x['end'])):
+            if entity['start'] >= last_end:
+                kept.append(entity)
+                last_end = entity['end']
+        return kept
+
+    def _find_repeat_mentions(self, text: str, entities: List[Dict]) -> List[Dict]:
+        """
+        Find every whole-word occurrence of the detected entities in a single pass over the text
+        Args:
+            text (str): Text the entity offsets refer to
+            entities (List[Dict]): Detected entities with start, end and replacement
+        Returns:
+            List[Dict]: Copies of the entities for each occurrence, including the original ones
+        """
+        # Map each mention to the first entity it was detected as
+        mentions = {}
+        for entity in entities:
+            mention = text[entity['start']:entity['end']]
+            if len(mention) > 1:
+                mentions.setdefault(mention, entity)
+        if not mentions:
+            return []
+        
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for mention, entity in mentions.items():
+                automaton.add_word(mention, (len(mention), entity))
+            automaton.make_automaton()
+            occurrences = []
+            for end, (length, entity) in automaton.iter(text):
+                start = end + 1 - length
+                end += 1
+                # Skip occurrences that are only part of a longer word
+                if (start > 0 and text[start-1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                    continue
+                occurrences.append({**entity, 'start': start, 'end': end})
+            return occurrences
+        
+        # Longest mentions first so the alternation prefers complete matches. The word boundaries
+        # are part of the pattern so a partial longer match backtracks to a shorter mention
+        pattern = re.compile(r'(?<![^\W_])(?:' + '|'.join(map(re.escape, sorted(mentions, key=len, reverse=True))) + r')(?![^\W_])')
+        return [{**mentions[match.group()], 'start': match.start(), 'end': match.end()} for match in pattern.finditer(text)]
+
+    def _replace_entities(self, text: str, entities: List[Dict]) -> str:
+        """
+        Replace entity spans in a single left-to-right pass
+        Args:
+            text (str): Text the entity offsets refer to
+            entities (List[Dict]): Non-overlapping entities sorted by start, as returned by
+                _resolve_overlaps, with start, end and replacement
+        Returns:
+            str: Text with every entity span replaced
+        """
+        if not entities:
+            return text
+        
+        # Collect slices and replacements, then build the result with a single allocation
+        parts = []
+        cursor = 0
+        for entity in entities:
+            parts.append(text[cursor:entity['start']])
+            replacement = entity.get('replacement')
+            if replacement is None:
+                replacement = self.replacement_dict.get(entity.get('entity'), '[UNKNOWN]')
+            parts.append(replacement)
+            cursor = entity['end']
+        parts.append(text[cursor:])
+        return ''.join(parts)
+
     def anonymize_text(self, text: str) -> str:
         """
         Anonymize text by detecting and replacing entities
@@ -172,28 +628,15 @@ class DataAnonymizer:
         Returns:
             str: Anonymized text
         """
-        # Normalize text while preserving case
-        text = self._normalize_text(text)
+        # Normalize text while preserving case, keeping a map back to the original offsets
+        normalized_text, offset_map = self._normalize_text_with_offsets(text)
         
-        # Get all entities from BERT model
-        ner_results = self._query_model(text)
-        
-        # Get additional entities (email and phone)
-        additional_entities = self._detect_email(text) + self._detect_phone(text)
-        
-        # Common location suffixes and prefixes for better detection
-        location_suffixes = ('burg', 'berg', 'town', 'city', 'ville', 'polis', 'grad', 'abad', 'pur', 'nagar', 'pore', 'stan', 'land', 'ia', 'ya')
-        location_prefixes = ('new', 'old', 'north', 'south', 'east', 'west', 'upper', 'lower', 'port', 'fort', 'saint', 'san', 'santa')
-        
-        # Common surname patterns from different cultures
-        surname_patterns = {
-            'slavic': ('ov', 'ev', 'ski', 'sky', 'ova', 'eva'),
-            'asian': ('yan', 'ian', 'jin', 'chen', 'li', 'wang'),
-            'nordic': ('sen', 'sson', 'dottir', 'dóttir'),
-            'middle_eastern': ('zadeh', 'oglu', 'oglu', 'oglu', 'pour'),
-            'indian': ('raj', 'kumar', 'singh', 'patel', 'sharma'),
-            'hispanic': ('ez', 'es', 'os', 'as', 'is')
-        }
+        # Get all entities from BERT model while detecting additional entities (email and phone)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ner_future = executor.submit(self._query_model, normalized_text)
+            additional_future = executor.submit(lambda: self._detect_email(normalized_text) + self._detect_phone(normalized_text))
+            ner_results = ner_future.result()
+            additional_entities = additional_future.result()
         
         # Combine all entities and sort by start position (reversed to avoid position conflicts)
         all_entities = []
@@ -212,18 +655,21 @@ class DataAnonymizer:
                 if len(word) < 2 or not word.replace('-', '').isalnum():
                     continue
                 
+                # Look up the (memoized) case classification of the word
+                is_upper, is_lower, is_title, is_alpha = self._classify_case(word)
+                
                 # Handle case sensitivity for person names
                 if entity_group == 'PER':
                     # Check if the word is all uppercase
-                    if word.isupper() and word.isalpha():
+                    if is_upper and is_alpha:
                         replacement = '[PERSON]'
                     # Check if the word is all lowercase
-                    elif word.islower():
+                    elif is_lower:
                         replacement = '[person]'
                     # Check if the word is title case
-                    elif word.istitle():
+                    elif is_title:
                         # Check if it matches any surname patterns
-                        is_surname = any(word.lower().endswith(pattern) for patterns in surname_patterns.values() for pattern in patterns)
+                        is_surname = self._SURNAME_RE.search(word) is not None
                         if is_surname:
                             replacement = '[SURNAME]'
                         else:
@@ -234,25 +680,25 @@ class DataAnonymizer:
                 # Handle organizations
                 elif entity_group == 'ORG':
                     # If it's all uppercase and contains only letters, it might be a name
-                    if word.isupper() and word.isalpha():
+                    if is_upper and is_alpha:
                         replacement = '[PERSON]'
                     # If it's title case and contains only letters, it might be a name
-                    elif word.istitle() and word.isalpha():
+                    elif is_title and is_alpha:
                         replacement = '[Person]'
                     # If it contains numbers or special chars, it's definitely an organization
-                    elif not word.isalpha():
+                    elif not is_alpha:
                         replacement = '[ORGANIZATION]'
                     else:
                         replacement = self.replacement_dict.get(entity_group, '[UNKNOWN]')
                 # Handle locations
                 elif entity_group == 'LOC':
                     # If it's all uppercase and contains only letters, it might be a name
-                    if word.isupper() and word.isalpha():
+                    if is_upper and is_alpha:
                         replacement = '[PERSON]'
                     # If it's title case and contains only letters, it might be a name
-                    elif word.istitle() and word.isalpha():
+                    elif is_title and is_alpha:
                         # Check if it's likely a location based on suffixes/prefixes
-                        if word.lower().endswith(location_suffixes) or word.lower().startswith(location_prefixes):
+                        if _LOC_SUFFIX_RE.search(word) or _LOC_PREFIX_RE.match(word):
                             replacement = '[LOCATION]'
                         else:
                             replacement = '[Person]'
@@ -270,32 +716,41 @@ class DataAnonymizer:
                 })
         
         all_entities.extend(additional_entities)
-        all_entities.sort(key=lambda x: x['start'], reverse=True)
         
-        # Replace entities with anonymized versions
-        anonymized_text = text
+        # Locate every word once so entity boundaries can be widened by binary search
+        word_spans = [(match.start(), match.end()) for match in _WORD_RE.finditer(text)]
+        word_starts = [span[0] for span in word_spans]
+        
+        # Collect the spans to replace with anonymized versions
+        spans = []
         for entity in all_entities:
             replacement = entity.get('replacement', self.replacement_dict.get(entity['entity'], '[UNKNOWN]'))
             
-            # Get the word boundaries
+            # Get the word boundaries, translated from the normalized text to the original
             start = entity['start']
             end = entity['end']
+            if offset_map is not None:
+                start = offset_map[min(start, len(offset_map) - 1)]
+                end = offset_map[min(end, len(offset_map) - 1)]
             
-            # Find the complete word boundaries
-            while start > 0 and anonymized_text[start-1].isalnum():
-                start -= 1
-            while end < len(anonymized_text) and anonymized_text[end].isalnum():
-                end += 1
+            # Find the complete word boundaries: extend start back over the word ending at it
+            # and end forward over the word containing it
+            i = bisect.bisect_left(word_starts, start) - 1
+            if i >= 0 and start <= word_spans[i][1]:
+                start = word_spans[i][0]
+            j = bisect.bisect_right(word_starts, end) - 1
+            if j >= 0 and end < word_spans[j][1]:
+                end = word_spans[j][1]
+            
+            # Only replace if we're replacing a complete word
+            word_to_replace = text[start:end]
+            if word_to_replace.isalnum() and len(word_to_replace) > 1:
+                spans.append({'start': start, 'end': end, 'replacement': replacement})
             
-            # Only replace if we're at word boundaries and the word is complete
-            if (start == 0 or not anonymized_text[start-1].isalnum()) and \
-               (end == len(anonymized_text) or not anonymized_text[end].isalnum()):
-                # Check if we're replacing a complete word
-                word_to_replace = anonymized_text[start:end]
-                if word_to_replace.isalnum() and len(word_to_replace) > 1:
-                    anonymized_text = anonymized_text[:start] + replacement + anonymized_text[end:]
+        # Also replace repeat mentions the model did not return
+        spans.extend(self._find_repeat_mentions(text, spans))
             
-        return anonymized_text
+        return self._replace_entities(text, self._resolve_overlaps(spans))
 
 # Example usage
 if __name__ == "__main__":